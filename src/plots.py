@@ -1,9 +1,14 @@
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import sys
+import matplotlib  # type: ignore
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt  # type: ignore
 import numpy as np
-from typing import List
+import orjson
+import os
+import pickle
 
 # CI
 efgreen         = "#005953"
@@ -11,73 +16,99 @@ eflightgreen    = "#69a3a2"
 eflightergreen  = "#a2c5c4"
 eflightestgreen = "#e6efee"
 
+# Keys of the 'Status' and 'Sponsor' dicts in the log,
+# and the names of the columns we parse them into
+status_keys  = ["new", "approved", "partially paid", "paid", "checked in"]
+status_cols  = ["new", "approved", "partial", "paid", "checkedin"]
+sponsor_cols = ["normal", "sponsor", "supersponsor"]
+
+# x ticks of the time plots: months of the reg period
+# and the days of the con
+month_ticks  = [datetime.date(2025, m, 1) for m in range(1, 10)]
+month_labels = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep"]
+con_ticks    = [datetime.date(2025, 9, d) for d in range(2, 8)]
+con_labels   = ["2nd", "3rd", "4th", "5th", "6th", "7th"]
+
+
+# Note on performance: parsing is bound by orjson.loads and the
+# records-to-frame conversion, both of which already run in C. Numba
+# would not help here: it cannot work on dicts of strings, and once
+# the data is flat arrays, the vectorised pandas code is just as fast.
+def parse_log(filename: str,
+              start: int = 0) -> tuple[pd.core.frame.DataFrame, int]:
+    ''' Parse the log from byte offset start up to its end.
+    Return the parsed entries and the offset we stopped at. '''
 
-def parse_status_dict(status_dict: dict) -> tuple[int, int, int, int]:
-    ''' Parse a single registration status dictionary.
-    Missing values will be set to zero. '''
-
-    new       = status_dict.get("new", 0)
-    approved  = status_dict.get("approved", 0)
-    partially = status_dict.get("partially paid", 0)
-    paid      = status_dict.get("paid", 0)
-    checkedin = status_dict.get("checked in", 0)
-    return (new, approved, partially, paid, checkedin)
-
-
-def parse_sponsor_dict(sponsor_dict: dict) -> tuple[int, int, int]:
-    ''' Parse a single sponsor status dictionary.
-    Missing values will be set to zero. '''
-
-    normal       = sponsor_dict.get("normal", 0)
-    sponsor      = sponsor_dict.get("sponsor", 0)
-    supersponsor = sponsor_dict.get("supersponsor", 0)
-    return (normal, sponsor, supersponsor)
-
-
-def split_tuplecol(df: pd.core.frame.DataFrame,
-                   incol: str,
-                   outcols: List[str]) -> pd.core.frame.DataFrame:
-    ''' Given a column of tuples, make a set of new columns,
-        containing the tuple elements. Drop input column. '''
-
-    # Sanity check: Make sure every element of the input column contains
-    # an iterable with as many elements as we have output columns.
-    if not all(df[incol].apply(len) == len(outcols)):
-        sys.exit(f"split.tuplecol: Malformed entry in column {incol}.")
+    # For now, we only need the time stamp, the total count (for sanity
+    # checks), the reg status and the sponsor category column. Parse the
+    # log line by line and keep only those fields of every entry, with
+    # the 'Status' and 'Sponsor' dicts flattened into the same record.
+    try:
+        with open(filename, "rb") as f:
+            f.seek(start)
+            rows = [{"CurrentDateTimeUtc": r["CurrentDateTimeUtc"],
+                     "TotalCount":         r["TotalCount"],
+                     **r["Status"],
+                     **r["Sponsor"]}
+                    for r in map(orjson.loads, f)]
+            end  = f.tell()
+    except (OSError, ValueError) as e:
+        sys.exit(f"parse_log: Error while loading source data: {e}")
+    
+    # Turn the records into individual columns.
+    # Missing values will be set to zero. All counts are small,
+    # so 32 bit integers are plenty. Build them as one 2D array,
+    # s.t. they end up in a single contiguous block of the frame.
+    raw          = pd.DataFrame.from_records(rows)
+    raw          = raw.reindex(columns = ["CurrentDateTimeUtc", "TotalCount"]
+                                         + status_keys + sponsor_cols)
+    counts       = raw.iloc[:, 1:].fillna(0).to_numpy(dtype = np.int32)
+    df           = pd.DataFrame(counts,
+                                columns = ["TotalCount"] + status_cols + sponsor_cols)
+    
+    # Parse timestamp column via direct conversion
+    df.insert(0, "CurrentDateTimeUtc", pd.to_datetime(raw.CurrentDateTimeUtc))
     
-    for i, outcol in enumerate(outcols):
-        df[outcol] = [x[i] for x in df[incol]]
+    return df, end
 
-    df.drop(columns = [incol], inplace = True)
-    return df
 
+def read_parse_input(filename: str = "./data/log.txt",
+                     cachedir: str = "./cache") -> pd.core.frame.DataFrame:
+    ''' Load the parsed log, reusing what a previous run cached.
+    The log is append-only, so if it has only grown since then,
+    we just parse the new lines and append them. '''
 
-def read_parse_input(filename: str = "./data/log.txt") -> pd.core.frame.DataFrame:
-    # For now, we only need the time stamp, the total count (for sanity
-    # checks), the reg status and the sponsor category column.
     try:
-        df = pd.read_json(filename, lines = True)
-    except ValueError as e:
+        stat = os.stat(filename)
+    except OSError as e:
         sys.exit(f"read_parse_input: Error while loading source data: {e}")
-    df = df.loc[:, ["CurrentDateTimeUtc", "TotalCount", "Status", "Sponsor"]]
-    
-    # Parse timestamp column via direct conversion
-    df.CurrentDateTimeUtc = pd.to_datetime(df.CurrentDateTimeUtc)
-    
-    # Parse 'Status' and 'Sponsor' column from dicts to tuples.
-    df.Status  = df.Status.apply(parse_status_dict)
-    df.Sponsor = df.Sponsor.apply(parse_sponsor_dict)
-    
-    # Turn the two tuple columns into sets of individual columns.
-    status_cols  = ["new", "approved", "partial", "paid", "checkedin"]
-    sponsor_cols = ["normal", "sponsor", "supersponsor"]
-    df           = split_tuplecol(df      = df,
-                                  incol   = "Status",
-                                  outcols = status_cols)
-    df           = split_tuplecol(df      = df,
-                                  incol   = "Sponsor",
-                                  outcols = sponsor_cols)
-    
+    cachefile = os.path.join(cachedir, os.path.basename(filename) + ".pkl")
+
+    # Any cache we cannot read is treated as missing
+    try:
+        with open(cachefile, "rb") as f:
+            cache = pickle.load(f)
+    except Exception:
+        cache = None
+
+    if cache is not None and cache["size"] == stat.st_size \
+            and cache["mtime"] == stat.st_mtime_ns:
+        return cache["df"]
+
+    if cache is not None and cache["size"] < stat.st_size:
+        new, end = parse_log(filename, start = cache["size"])
+        df       = pd.concat([cache["df"], new], ignore_index = True)
+    else:
+        df, end  = parse_log(filename)
+
+    # Failing to write the cache only costs a full parse next time
+    try:
+        os.makedirs(cachedir, exist_ok = True)
+        with open(cachefile, "wb") as f:
+            pickle.dump({"size": end, "mtime": stat.st_mtime_ns, "df": df}, f)
+    except OSError:
+        pass
+
     return df
 
 
@@ -85,13 +116,13 @@ def daywise(df: pd.core.frame.DataFrame,
     offset: int) -> pd.core.frame.DataFrame:
     ''' Calculate day-wise count'''
 
-    # Working copy
-    out          = df.copy()
+    # Working copy of the only two columns we need
+    out          = df.loc[:, ["CurrentDateTimeUtc", "TotalCount"]].copy()
 
     # Get last count for every day
-    out["Date"]  = pd.to_datetime(df['CurrentDateTimeUtc']).dt.strftime('%m/%d/%Y')
-    out          = out.groupby("Date").agg("last").reset_index()
-    out          = out.loc[:, ["Date", "TotalCount"]]
+    out["Date"]  = out["CurrentDateTimeUtc"].dt.floor("D")
+    out          = out.drop_duplicates(subset = "Date", keep = "last")
+    out          = out.loc[:, ["Date", "TotalCount"]].reset_index(drop = True)
     
     # Add day index, shifted by offset of three,
     # s.t. day 0 is the day of reg opening
@@ -100,68 +131,33 @@ def daywise(df: pd.core.frame.DataFrame,
     return out
 
 
-def makeplots(df: pd.core.frame.DataFrame,
-              df_last: pd.core.frame.DataFrame) -> None:
+def prepare_figure(s: int) -> tuple[plt.Figure, np.ndarray, plt.Axes]:
+    ''' Set up the figure and everything in it that does not depend
+    on the data: axis labels, ticks, limits and grid lines. Returns
+    the figure, its axes and the twin y axis of the bottom-right plot. '''
 
-    ##################        
-    # Prepare figure #
-    ##################
-
-    s = 20
-    fig, axes = plt.subplots(nrows = 2, ncols = 2, figsize = (15,15))
-    plt.subplots_adjust(hspace = .3, wspace=.3)
-    for ax in axes.flat:
-        ax.set_visible(False)
+    # Fixed margins, s.t. we can export without a tight bounding box
+    fig, axes = plt.subplots(nrows = 2, ncols = 2, figsize = (14.6, 13.5))
+    plt.subplots_adjust(left   = .13,
+                        right  = .926,
+                        bottom = .126,
+                        top    = .982,
+                        hspace = .3,
+                        wspace = .3)
 
     #############
     # Left plot #
     #############
 
     ax           = axes.flat[0]
-    ax.set_visible(True)
-
-    df["totals"] = df.new + df.approved + df.partial + df.paid + df.checkedin
-    
-    # Comment in this block and change colours of the
-    # other lines, once people can check in on-site
-    ax.plot(df.CurrentDateTimeUtc,
-            df.checkedin,
-            c      = efgreen,
-            lw     = 2,
-            marker = "",
-            label  = "Checked in")
-    
-    ax.plot(df.CurrentDateTimeUtc,
-            df.totals,
-            c      = eflightgreen,
-            lw     = 2,
-            marker = "",
-            label  = "Total")
-    ax.plot(df.CurrentDateTimeUtc,
-            df.paid + df.partial + df.checkedin,
-            c      = eflightergreen,
-            lw     = 2,
-            marker = "",
-            label  = "Paid (incl. partial)")
 
     # x axis
     ax.set_xlabel(xlabel   = "Time",
                   fontsize = s,
                   labelpad = 10)
     
-    ax.set_xticks([datetime.date(2025, 1, 1),
-                   datetime.date(2025, 2, 1),
-                   datetime.date(2025, 3, 1),
-                   datetime.date(2025, 4, 1),
-                   datetime.date(2025, 5, 1),
-                   datetime.date(2025, 6, 1),
-                   datetime.date(2025, 7, 1),
-                   datetime.date(2025, 8, 1),
-                   datetime.date(2025, 9, 1)
-                  ])
-    ax.set_xticklabels(["Jan", "Feb", "Mar", "Apr",
-                        "May", "Jun", "Jul", "Aug",
-                        "Sep"])
+    ax.set_xticks(month_ticks)
+    ax.set_xticklabels(month_labels)
 
     ax.tick_params(axis      = "x",
                    which     = "both",
@@ -176,23 +172,15 @@ def makeplots(df: pd.core.frame.DataFrame,
                   fontsize = s,
                   labelpad = 10)
     ax.set_yticks([0, 1000, 2000, 3000, 4000, 5000, 6000, 7000])
-    ax.hlines(y      = [1000 * i for i in range(50)],
-              xmin   = datetime.date(2025, 1, 1),
-              xmax   = datetime.date(2025, 10, 1),
-              colors = "lightgrey",
-              ls     = "-",
-              lw     = 0.5)
+    ax.grid(axis  = "y",
+            color = "lightgrey",
+            ls    = "-",
+            lw    = 0.5)
     ax.tick_params(axis      = "y",
                    which     = "both",
                    labelsize = s,
                    pad       = 10)
     ax.set_ylim((0, 7000))
-    
-    # Legend
-    ax.legend(loc      = 9,
-              fontsize = 15,
-              ncols    = 2,
-              frameon  = False)
 
 
     ##############
@@ -200,26 +188,6 @@ def makeplots(df: pd.core.frame.DataFrame,
     ##############
 
     ax = axes.flat[1]
-    ax.set_visible(True)
-    nb_normal = df.iloc[-1,:].normal
-    nb_spons  = df.iloc[-1,:].sponsor
-    nb_super  = df.iloc[-1,:].supersponsor
-    
-    ax.barh(y     = 0,
-            width = nb_normal,
-            color = eflightergreen,
-            label = "Normal")
-    ax.barh(y     = 0,
-            width = nb_spons,
-            left  = nb_normal,
-            color = eflightgreen,
-            label = "Sponsor")
-    ax.barh(y     = 0,
-            width = nb_super,
-            left  = nb_normal + nb_spons,
-            color = efgreen,
-            label = "Supersponsor")
-    
     
     # x axis
     ax.set_xlabel(xlabel   = "Count",
@@ -236,38 +204,13 @@ def makeplots(df: pd.core.frame.DataFrame,
     ax.set_ylabel(ylabel  = "")
     ax.set_ylim((-1.5, 1.5))
     ax.set_yticks([])
-    
-    # Legend
-    ax.legend(loc      = 9,
-              fontsize = 15,
-              ncols    = 2,
-              frameon  = False)
 
 
     ####################
     # Bottom-left plot #
     ####################
-        
-    # We need daywise data for the bottom-left plot
-    df_daywise      = daywise(df, offset = 33)
-    df_last_daywise = daywise(df_last, offset = 3)
-    
-    # Set up plot and plot the two time-courses
-    ax = axes.flat[2]
-    ax.set_visible(True)
-    ax.plot(df_daywise.idx,
-            df_daywise.TotalCount,
-            lw     = 2,
-            c      = efgreen,
-            label  = "2025",
-            zorder = 100)
-    ax.plot(df_last_daywise.idx,
-            df_last_daywise.TotalCount,
-            lw    = 2,
-            c     = eflightgreen,
-            label = "2024")
-    ax.vlines([200], 0, 10000, color = "grey", ls=":", label = "EF 2025 Begins")
 
+    ax = axes.flat[2]
     
     # x axis
     ax.set_xlabel(xlabel   = "Day After Reg Opening",
@@ -288,39 +231,20 @@ def makeplots(df: pd.core.frame.DataFrame,
                    labelsize = s,
                    pad       = 10)
     ax.set_ylim((0, 7000))
-    
-    # Legend
-    ax.legend(loc      = 2,
-              fontsize = 15,
-              ncols    = 1,
-              frameon  = False)
 
     #####################
     # Bottom-right plot #
     #####################
 
     ax           = axes.flat[3]
-    ax.set_visible(True)
-    
-    ax.plot(df.CurrentDateTimeUtc,
-            df.checkedin,
-            c      = efgreen,
-            lw     = 2,
-            marker = "",
-            label  = "Checked in")
 
     # x axis
     ax.set_xlabel(xlabel   = "Date",
                   fontsize = s,
                   labelpad = 10)
     
-    ax.set_xticks([datetime.date(2025, 9, 2),
-                  datetime.date(2025, 9, 3),
-                  datetime.date(2025, 9, 4),
-                  datetime.date(2025, 9, 5),
-                  datetime.date(2025, 9, 6),
-                  datetime.date(2025, 9, 7)])
-    ax.set_xticklabels(["2nd", "3rd", "4th", "5th", "6th", "7th"])
+    ax.set_xticks(con_ticks)
+    ax.set_xticklabels(con_labels)
 
     ax.tick_params(axis      = "x",
                    which     = "both",
@@ -335,12 +259,10 @@ def makeplots(df: pd.core.frame.DataFrame,
                   fontsize = s,
                   labelpad = 10)
     ax.set_yticks([0, 1000, 2000, 3000, 4000, 5000, 6000, 7000])
-    ax.hlines(y      = [1000 * i for i in range(50)],
-              xmin   = datetime.date(2025, 9, 2),
-              xmax   = datetime.date(2025, 9, 7),
-              colors = "lightgrey",
-              ls     = "-",
-              lw     = 0.5)
+    ax.grid(axis  = "y",
+            color = "lightgrey",
+            ls    = "-",
+            lw    = 0.5)
     ax.tick_params(axis      = "y",
                    which     = "both",
                    labelsize = s,
@@ -361,9 +283,134 @@ def makeplots(df: pd.core.frame.DataFrame,
     ax2.spines['right'].set_color('C0')
     ax2.tick_params(axis='y', colors='C0')
 
-    df.delta_checkins = df.checkedin.rolling(window=2).apply(lambda x: x.iloc[1] - x.iloc[0])
-    df.delta_min      = df.CurrentDateTimeUtc.astype(int).rolling(window=2).apply(lambda x: x.iloc[1] - x.iloc[0]) / 1e9 / 60
-    df.checkinrate    = df.delta_checkins / df.delta_min
+    return fig, axes, ax2
+
+
+def makeplots(df: pd.core.frame.DataFrame,
+              df_last: pd.core.frame.DataFrame) -> None:
+
+    ##################        
+    # Prepare figure #
+    ##################
+
+    s = 20
+    fig, axes, ax2 = prepare_figure(s)
+
+    #############
+    # Left plot #
+    #############
+
+    ax           = axes.flat[0]
+
+    df["totals"]    = df[status_cols].sum(axis = 1)
+    df["paid_incl"] = df[["paid", "partial", "checkedin"]].sum(axis = 1)
+    
+    # Comment in this block and change colours of the
+    # other lines, once people can check in on-site
+    ax.plot(df.CurrentDateTimeUtc,
+            df.checkedin,
+            c      = efgreen,
+            lw     = 2,
+            marker = "",
+            label  = "Checked in")
+    
+    ax.plot(df.CurrentDateTimeUtc,
+            df.totals,
+            c      = eflightgreen,
+            lw     = 2,
+            marker = "",
+            label  = "Total")
+    ax.plot(df.CurrentDateTimeUtc,
+            df.paid_incl,
+            c      = eflightergreen,
+            lw     = 2,
+            marker = "",
+            label  = "Paid (incl. partial)")
+    
+    # Legend
+    ax.legend(loc      = 9,
+              fontsize = 15,
+              ncols    = 2,
+              frameon  = False)
+
+
+    ##############
+    # Right plot #
+    ##############
+
+    ax = axes.flat[1]
+    latest    = df.iloc[-1,:]
+    nb_normal = latest.normal
+    nb_spons  = latest.sponsor
+    nb_super  = latest.supersponsor
+    
+    ax.barh(y     = 0,
+            width = nb_normal,
+            color = eflightergreen,
+            label = "Normal")
+    ax.barh(y     = 0,
+            width = nb_spons,
+            left  = nb_normal,
+            color = eflightgreen,
+            label = "Sponsor")
+    ax.barh(y     = 0,
+            width = nb_super,
+            left  = nb_normal + nb_spons,
+            color = efgreen,
+            label = "Supersponsor")
+    
+    # Legend
+    ax.legend(loc      = 9,
+              fontsize = 15,
+              ncols    = 2,
+              frameon  = False)
+
+
+    ####################
+    # Bottom-left plot #
+    ####################
+        
+    # We need daywise data for the bottom-left plot
+    df_daywise      = daywise(df, offset = 33)
+    df_last_daywise = daywise(df_last, offset = 3)
+    
+    # Plot the two time-courses
+    ax = axes.flat[2]
+    ax.plot(df_daywise.idx,
+            df_daywise.TotalCount,
+            lw     = 2,
+            c      = efgreen,
+            label  = "2025",
+            zorder = 100)
+    ax.plot(df_last_daywise.idx,
+            df_last_daywise.TotalCount,
+            lw    = 2,
+            c     = eflightgreen,
+            label = "2024")
+    ax.vlines([200], 0, 10000, color = "grey", ls=":", label = "EF 2025 Begins")
+    
+    # Legend
+    ax.legend(loc      = 2,
+              fontsize = 15,
+              ncols    = 1,
+              frameon  = False)
+
+    #####################
+    # Bottom-right plot #
+    #####################
+
+    ax           = axes.flat[3]
+    
+    ax.plot(df.CurrentDateTimeUtc,
+            df.checkedin,
+            c      = efgreen,
+            lw     = 2,
+            marker = "",
+            label  = "Checked in")
+
+    df["delta_checkins"] = df.checkedin.diff()
+    df["delta_min"]      = df.CurrentDateTimeUtc.diff().dt.total_seconds() / 60.0
+    df["checkinrate"]    = df.delta_checkins / df.delta_min
     ax2.plot(df.CurrentDateTimeUtc,
             df.checkinrate,
             c      = "C0",
@@ -374,7 +421,7 @@ def makeplots(df: pd.core.frame.DataFrame,
     # Annotations #
     ###############
     
-    last     = str(df.CurrentDateTimeUtc.tolist()[-1]).split(".")[0]
+    last     = df.CurrentDateTimeUtc.iat[-1].strftime("%Y-%m-%d %H:%M:%S")
  
     annot    = \
 f'''Last update {last} (UTC).
@@ -385,11 +432,11 @@ For questions, contact @GermanCoyote.'''
                 fontsize = s/3)
 
     # Upper-left plots
-    new       = df.new.tolist()[-1]
-    approved  = df.approved.tolist()[-1]
-    partial   = df.partial.tolist()[-1]
-    paid      = df.paid.tolist()[-1]
-    checkedin = df.checkedin.tolist()[-1]
+    new       = latest.new
+    approved  = latest.approved
+    partial   = latest.partial
+    paid      = latest.paid
+    checkedin = latest.checkedin
     total     = new + approved + partial + paid + checkedin
     annot     = \
 f'''{total} total regs, out of which {partial + paid} paid at least partially. Checked-in: {checkedin}.'''
@@ -412,15 +459,14 @@ f'''{total} total paid regs ({nb_normal} normal, {nb_spons} sponsors, {nb_super}
     # Export figure #
     #################
 
-    plt.savefig(fname       = "./out/Fig1.svg",
-                bbox_inches = "tight")
+    plt.savefig(fname = "./out/Fig1.svg")
 
 
 if __name__ == "__main__":
-    # This year's data, from our own logger
-    ef2024 = read_parse_input()
-    
-    # Last year's data: TODO
-    ef2023 = read_parse_input("./data/log2024.txt")
+    # This year's data, from our own logger, and last year's data (TODO).
+    # The two logs are independent, so load them concurrently.
+    with ThreadPoolExecutor(max_workers = 2) as ex:
+        ef2024, ef2023 = ex.map(read_parse_input,
+                                ["./data/log.txt", "./data/log2024.txt"])
     
     makeplots(ef2024, ef2023)